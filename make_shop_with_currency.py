@@ -1,6 +1,30 @@
-import argparse, sys, pandas, numpy, math, re, json
+import argparse, sys, pandas, numpy, math, json
+from types import MappingProxyType
+from functools import lru_cache
+from html import escape
 from pandas import DataFrame
 
+CSV_COLUMNS = ['Name', 'Price (gp)', 'Weight (lb.)', 'Category', 'Properties', 'AC', 'Damage', 'Tags', 'Source']
+CSV_DTYPES = {
+	'Name': 'string',
+	'Price (gp)': 'float64',
+	'Weight (lb.)': 'float64',
+	'Category': 'category',
+	'Properties': 'string',
+	'AC': 'string',
+	'Damage': 'string',
+	'Tags': 'string',
+	'Source': 'category',
+}
+
+_STD_CURRENCY = MappingProxyType({'gp': 1.0, 'sp': 0.1, 'cp': 0.01})
+_STD_WEIGHT = MappingProxyType({'ton': 2000.0, 'lb.': 1.0, 'oz': 1/16})
+
+TAGSET_COLUMN = '_tagset'
+CSV_CHUNK_ROWS = 65536
+
+_FMT_CACHE = {}
+
 
 def main():
 	parser = argparse.ArgumentParser(
@@ -87,13 +111,11 @@ def run(kwargs):
 	# print('kwargs.json',kwargs.json)
 	# print('kwargs.txt',kwargs.txt)
 	# print('kwargs.html',kwargs.html)
-	collection: DataFrame = None
-	for src in kwargs.source_files:
-		df = pandas.read_csv(src)
-		if collection is None:
-			collection = df
-		else:
-			collection.append(df)
+	frames = [read_items(src) for src in kwargs.source_files]
+	collection: DataFrame = pandas.concat(frames, ignore_index=True)
+	if kwargs.include is not None or kwargs.require is not None or kwargs.exclude is not None:
+		# parse tags once and share the result between all of the tag filters
+		collection[TAGSET_COLUMN] = parse_tag_sets(collection)
 	if kwargs.include is not None:
 		collection = includeTags(collection, [x[0] for x in kwargs.include])
 	if kwargs.require is not None:
@@ -101,32 +123,10 @@ def run(kwargs):
 	if kwargs.exclude is not None:
 		collection = excludeTags(collection, [x[0] for x in kwargs.exclude])
 	#
-	weight_dict = {}
-	if kwargs.nostd == False:
-		weight_dict = {
-			'ton':2000,
-			'lb.':1,
-			'oz':1/16
-		}
-	if kwargs.weights is not None:
-		for w in kwargs.weights:
-			s = w[0].split('=')
-			xx = str(s[0]).strip()
-			vv = float(str(s[1]).strip())
-			weight_dict[xx] = vv
-	currency_dict = {}
-	if kwargs.nostd == False:
-		currency_dict = {
-			'gp':1,
-			'sp':0.1,
-			'cp':0.01,
-		}
-	if kwargs.currencies is not None:
-		for c in kwargs.currencies:
-			s = c[0].split('=')
-			xx = str(s[0]).strip()
-			vv = float(str(s[1]).strip())
-			currency_dict[xx] = vv
+	user_weights = dict(_parse_kv(w[0]) for w in (kwargs.weights or ()))
+	weight_dict = MappingProxyType(({} if kwargs.nostd else {**_STD_WEIGHT}) | user_weights)
+	user_currencies = dict(_parse_kv(c[0]) for c in (kwargs.currencies or ()))
+	currency_dict = MappingProxyType(({} if kwargs.nostd else {**_STD_CURRENCY}) | user_currencies)
 	store = create_store(item_table=collection, currency_dict=currency_dict, weight_dict=weight_dict, kwargs=kwargs)
 	print(output_ascii(store))
 	if kwargs.csv is not None:
@@ -138,29 +138,32 @@ def run(kwargs):
 	if kwargs.json is not None:
 		save_json(store, kwargs.json)
 
+def read_items(src) -> DataFrame:
+	# columns the shop does not display (e.g. AC without -A) may be absent; pandas ignores their dtypes
+	return pandas.read_csv(src, usecols=lambda c: c in CSV_COLUMNS, dtype=CSV_DTYPES, engine='c')
+
 def save_csv(shop: DataFrame, fpath):
 	if not str(fpath).lower().endswith('.csv'):
 		fpath = str(fpath) + '.csv'
-	shop.to_csv(fpath, index=False)
+	shop.to_csv(fpath, index=False, chunksize=CSV_CHUNK_ROWS, lineterminator='\n')
 
 def save_txt(shop: DataFrame, fpath):
 	if not str(fpath).lower().endswith('.txt'):
 		fpath = str(fpath) + '.txt'
-	shop.to_csv(fpath, index=False, sep='\t')
+	shop.to_csv(fpath, index=False, sep='\t', chunksize=CSV_CHUNK_ROWS, lineterminator='\n')
 
 def save_json(shop: DataFrame, fpath):
-	rows = []
-	for i, row in shop.iterrows():
-		d = {}
-		for c in shop.columns:
-			d[c] = row[c]
-		rows.append(d)
+	# shop cells are already plain strings, so zip rows straight into dicts without per-cell boxing
+	cols = list(shop.columns)
+	rows = [dict(zip(cols, row)) for row in shop.itertuples(index=False, name=None)]
 	with open(fpath, 'w') as fout:
-		json.dump(rows, fout, indent='\t')
+		fout.write(json.dumps(rows, indent='\t'))
 
 def save_html(shop: DataFrame, fpath):
-	html_str = '<html>\n<head>'
-	html_str += '''<style>
+	parts = []
+	append = parts.append
+	append('<html>\n<head>')
+	append('''<style>
 table {
 	border-collapse: collapse;
 }
@@ -194,24 +197,31 @@ tr:nth-child(even) {
 .Source {
 	text-align: center;
 }
-</style>'''
-	html_str += '</head>\n<body><table class="shoptable">\n'
-	html_str += '\t<tr class="header">'
-	for c in shop.columns:
-		html_str += '<th class="%s">%s</th>' % (str(c).replace(' ',''), str(c).replace('<','&lt;').replace('>','&gt;').replace('&','&amp;'))
-	html_str += '</tr>\n'
-	for i, row in shop.iterrows():
-		html_str += '\t<tr>'
-		for c in shop.columns:
-			n = str(row[c]).replace('<', '&lt;').replace('>', '&gt;').replace('&', '&amp;')
-			html_str += '<td class="%s">%s</td>' % (str(c).replace(' ',''), n)
-		html_str += '</tr>\n'
-	html_str += '</table></body></html>\n'
+</style>''')
+	append('</head>\n<body><table class="shoptable">\n')
+	columns = tuple(str(c) for c in shop.columns)
+	append(_header_html(columns))
+	row_tpl = _row_template(columns)
+	for row in shop.itertuples(index=False, name=None):
+		append(row_tpl % tuple(escape(str(v), quote=False) for v in row))
+	append('</table></body></html>\n')
 	with open(fpath, 'w') as fout:
-		fout.write(html_str)
+		fout.write(''.join(parts))
+
+@lru_cache(maxsize=16)
+def _header_html(columns: tuple) -> str:
+	return '\t<tr class="header">' + ''.join(
+		'<th class="%s">%s</th>' % (escape(c.replace(' ',''), quote=True), escape(c, quote=True)) for c in columns
+	) + '</tr>\n'
+
+@lru_cache(maxsize=16)
+def _row_template(columns: tuple) -> str:
+	# one %s slot per cell
+	return '\t<tr>' + ''.join(
+		'<td class="%s">%%s</td>' % escape(c.replace(' ',''), quote=True).replace('%', '%%') for c in columns
+	) + '</tr>\n'
 
 def create_store(item_table: DataFrame, currency_dict:{}=None, weight_dict:{}=None, kwargs={}) -> DataFrame:
-	out_rows = []
 	item_table.sort_values(by=['Category', 'Name'])
 	columns = ['Name', 'Price (gp)', 'Weight (lb.)']
 	if kwargs.armor:
@@ -222,20 +232,20 @@ def create_store(item_table: DataFrame, currency_dict:{}=None, weight_dict:{}=No
 		columns += ['Properties']
 	columns += ['Category', 'Source']
 	out_columns = [x.replace('Price (gp)', 'Price').replace('Weight (lb.)', 'Weight') for x in columns]
-	for i, row in item_table.iterrows():
-		orow = []
-		for col in columns:
-			if col == 'Price (gp)':
-				orow.append(to_currency(row[col], currency_dict=currency_dict, sigfigs=kwargs.sigfigs, nofree=(kwargs.free == False)))
-			elif col == 'Weight (lb.)':
-				orow.append(to_weight(row[col], weight_dict=weight_dict, sigfigs=kwargs.sigfigs))
-			else:
-				orow.append(format_entry(row[col]))
-		out_rows.append(orow)
-	return DataFrame(data=out_rows, columns=out_columns)
+	prices = to_units(item_table['Price (gp)'].to_numpy(dtype=float), unit_dict=currency_dict, sigfigs=kwargs.sigfigs, nofree=(kwargs.free == False))
+	weights = to_units(item_table['Weight (lb.)'].to_numpy(dtype=float), unit_dict=weight_dict, sigfigs=kwargs.sigfigs)
+	out_data = {}
+	for col, out_col in zip(columns, out_columns):
+		if col == 'Price (gp)':
+			out_data[out_col] = prices
+		elif col == 'Weight (lb.)':
+			out_data[out_col] = weights
+		else:
+			out_data[out_col] = [format_entry(n) for n in item_table[col].tolist()]
+	return DataFrame(out_data, columns=out_columns, dtype='string', copy=False)
 
 def output_ascii(store: DataFrame):
-	string_out = ''
+	parts = []
 	col_widths = {
 		'Name':20,
 		'Price':10,
@@ -258,154 +268,195 @@ def output_ascii(store: DataFrame):
 	}
 	widths = [col_widths[k] for k in store.columns]
 	aligns = [col_aligns[k] for k in store.columns]
-	string_out += string_box_row(store.columns, widths, ['center']*len(widths), v_align='bottom',
-								 draw_top_line=True, draw_bottom_line=True)
+	hrule = '+' + '+'.join('-'*w for w in widths) + '+\n'
+	string_box_row(store.columns, widths, ['center']*len(widths), v_align='bottom',
+								 draw_top_line=True, draw_bottom_line=True, parts=parts, hrule=hrule)
 	#
-	for i, row in store.iterrows():
-		string_out += string_box_row(row, widths, aligns, v_align='top',
-								 draw_top_line=False, draw_bottom_line=True)
-	return string_out
+	for row in store.itertuples(index=False, name=None):
+		string_box_row(row, widths, aligns, v_align='top',
+								 draw_top_line=False, draw_bottom_line=True, parts=parts, hrule=hrule)
+	return ''.join(parts)
 
-def string_box_row(texts, widths, h_alignments, v_align='top', draw_top_line=False, draw_bottom_line=False, h_delim='|', v_delim='-', x_delim='+'):
+def string_box_row(texts, widths, h_alignments, v_align='top', draw_top_line=False, draw_bottom_line=False, h_delim='|', v_delim='-', x_delim='+', parts: []=None, hrule: str=None):
+	# appends the row's lines to parts if given, otherwise returns them as a string
 	if not (v_align == 'top' or v_align == 'bottom'): raise KeyError('Vertical alignment %s not supported' % v_align)
 	if len(texts) != len(widths) or len(widths) != len(h_alignments):
 		raise KeyError('length of texts, widths, and h_alignments lists must be equal')
+	_len = len; _string_box = string_box  # local names for the per-cell loop
 	boxes = []
 	num_rows = 1
-	for i in range(0, len(texts)):
-		sbox = string_box(text=texts[i], w=widths[i], align=h_alignments[i])
+	for i in range(0, _len(texts)):
+		sbox = _string_box(text=texts[i], w=widths[i], align=h_alignments[i])
 		boxes.append(sbox)
-		if len(sbox) > num_rows:
-			num_rows = len(sbox)
+		if _len(sbox) > num_rows:
+			num_rows = _len(sbox)
 	row_boxes = []
-	if v_align == 'top':
-		for i in range(0, len(boxes)):
-			b = boxes[i]
-			while len(b) < num_rows:
-				b = b + [pad('', w=widths[i], align=h_alignments[i])]
-			row_boxes.append(b)
-	elif v_align == 'bottom':
-		for i in range(0, len(boxes)):
-			b = boxes[i]
-			while len(b) < num_rows:
-				b = [pad('', w=widths[i], align=h_alignments[i])] + b
-			row_boxes.append(b)
-	str_out = ''
+	for i in range(0, len(boxes)):
+		b = boxes[i]
+		if len(b) < num_rows:
+			filler = [pad('', w=widths[i], align=h_alignments[i])] * (num_rows - len(b))
+			b = b + filler if v_align == 'top' else filler + b
+		row_boxes.append(b)
+	out = [] if parts is None else parts
+	if hrule is None and (draw_top_line or draw_bottom_line):
+		hrule = x_delim + x_delim.join(v_delim*int(w) for w in widths) + x_delim + '\n'
 	if draw_top_line:
-		str_out += x_delim
-		for w in widths:
-			str_out += v_delim*int(w)
-			str_out += x_delim
-		str_out += '\n'
+		out.append(hrule)
 	for r in range(0, num_rows):
-		str_out += h_delim
-		for c in range(0, len(row_boxes)):
-			str_out += row_boxes[c][r]
-			str_out += h_delim
-		str_out += '\n'
+		out.append(h_delim + h_delim.join(b[r] for b in row_boxes) + h_delim + '\n')
 	if draw_bottom_line:
-		str_out += x_delim
-		for w in widths:
-			str_out += v_delim*int(w)
-			str_out += x_delim
-		str_out += '\n'
-	return str_out
+		out.append(hrule)
+	if parts is None:
+		return ''.join(out)
 
 def string_box(text: str, w: int, align='left') -> []:
 	# returns lines
 	text = text.strip()
-	if not (align == 'left' or align == 'right' or align == 'center'): raise KeyError('Alignment %s not supported' % align)
-	if len(text) <= w: return [pad(text, w, align)]
+	padder = _PADDERS.get(align)
+	if padder is None: raise KeyError('Alignment %s not supported' % align)
+	if len(text) <= w: return [padder(text, w)]
+	return [padder(line, w) for line in _wrap_lines(text, w)]
+
+def _wrap_lines(text: str, w: int) -> []:
+	# greedy word wrap: break at the last whitespace within w characters,
+	# or hyphenate when the first word does not fit
 	lines = []
-	match_expr = '.{1,'+str(int(w))+'}\\s'
-	while len(text) > 0:
-		chunk = re.match(match_expr, text)
-		if len(text) <= w:
-			lines.append(pad(text, w, align))
+	n = len(text)
+	i = 0
+	while i < n:
+		if n - i <= w:
+			lines.append(text[i:])
 			break
-		elif chunk is None:
-			## first word is too long
-			lines.append(pad(text[0:w-1]+'-', w, align))
-			text = text[w-1:].strip()
+		end = i + w
+		newline = text.find('\n', i, end)
+		if newline >= 0:
+			end = newline
+		k = end
+		while k > i and not text[k].isspace():
+			k -= 1
+		if k > i:
+			lines.append(text[i:k].rstrip())
+			j = k + 1
 		else:
-			lines.append(pad(chunk[0].strip(), w, align))
-			text = text[len(chunk[0]):].strip()
+			## first word is too long
+			lines.append(text[i:i+w-1] + '-')
+			j = i + w - 1
+		while j < n and text[j].isspace():
+			j += 1
+		i = j
 	return lines
 
+def _pad_center(text: str, w: int):
+	n: int = (w - len(text))
+	return ' ' * (n-(n//2)) + text + ' ' * (n//2)
+
+_PADDERS = {
+	'left': str.ljust,
+	'right': str.rjust,
+	'center': _pad_center,
+}
+
 def pad(text: str, w: int, align='left'):
-	if align == 'left':
-		return text + ' '*(w - len(text))
-	elif align == 'right':
-		return ' ' * (w - len(text)) + text
-	elif align == 'center':
-		n: int = (w - len(text))
-		return ' ' * (n-(n//2)) + text + ' ' * (n//2)
-	raise KeyError('Alignment %s not supported' % align)
+	padder = _PADDERS.get(align)
+	if padder is None: raise KeyError('Alignment %s not supported' % align)
+	return padder(text, w)
+
 
+def _pick_unit(value: float, unit_dict: {}, sigfigs: int):
+	# single pass over the units: the fewest whole units that still have the requested sig-figs,
+	# otherwise the most units available (ties broken by label, same as sorting (count, label) pairs)
+	_int = int; _digits = int_digits_int  # local names for the per-unit loop
+	best = None; most = None; smallest = None
+	for label in unit_dict:
+		denom = unit_dict[label]
+		key = (_int(value / denom), label)
+		if _digits(key[0]) >= sigfigs and (best is None or key < best):
+			best = key
+		if most is None or key > most:
+			most = key
+		if smallest is None or (denom, label) < smallest:
+			smallest = (denom, label)
+	num_units, unit_label = best if best is not None else most
+	if num_units <= 0:
+		# pick smallest denomination
+		unit_label = smallest[1]
+	return num_units, unit_label
 
 def to_currency(src_price, currency_dict: {}=None, sigfigs:int=2, nofree=True):
 	src_price = float(src_price)
-	default_fmt_str = '%.'+str(int(sigfigs))+'f'
 	if currency_dict is None or len(currency_dict) == 0:
 		# no currencies specified, use raw price
-		return default_fmt_str % src_price
+		return _fmt(sigfigs) % src_price
 	else:
 		# find highest value currency with given sigfigs integer value
-		prices = {}; int_key_list = []
-		for c in currency_dict:
-			p = src_price / currency_dict[c]
-			prices[c] = p
-			int_key_list.append((int(p), c))
-		int_key_list.sort() ## sorts from fewest to most coins
-		sigfig_list = [int_digits(x[0]) for x in int_key_list]
-		i = 0
-		while i < len(int_key_list) - 1:
-			if sigfig_list[i] >= sigfigs:
-				break
-			i += 1
-		num_coins = int_key_list[i][0]
-		coin_label = int_key_list[i][1]
-		if num_coins <= 0:
-			# pick smallest denomination
-			denom_key_list = [(currency_dict[k], k) for k in currency_dict]
-			denom_key_list.sort()  # sort by lowest to highest values
-			coin_label = denom_key_list[0][1]
-			if nofree == True and num_coins <= 0:
-				### no free lunch!
-				num_coins = 1
-		#return ('[%s] => ' % src_price)+str(num_coins) + ' ' + str(coin_label)
+		num_coins, coin_label = _pick_unit(src_price, currency_dict, sigfigs)
+		if nofree == True and num_coins <= 0:
+			### no free lunch!
+			num_coins = 1
 		return format_number(num_coins, sigfigs=sigfigs) + ' ' + str(coin_label)
 
 def to_weight(src_weight, weight_dict: {}=None, sigfigs:int=2):
 	src_weight = float(src_weight)
-	default_fmt_str = '%.'+str(int(sigfigs))+'f'
 	if weight_dict is None or len(weight_dict) == 0:
 		# no currencies specified, use raw price
-		return default_fmt_str % src_weight
+		return _fmt(sigfigs) % src_weight
 	else:
 		# find highest value with given sigfigs integer value
-		weights = {}; int_key_list = []
-		for c in weight_dict:
-			w = src_weight / weight_dict[c]
-			weights[c] = w
-			int_key_list.append((int(w), c))
-		int_key_list.sort() ## sorts from fewest to most coins
-		sigfig_list = [int_digits(x[0]) for x in int_key_list]
-		i = 0
-		while i < len(int_key_list) - 1:
-			if sigfig_list[i] >= sigfigs:
-				break
-			i += 1
-		num_w = int_key_list[i][0]
-		w_label = int_key_list[i][1]
-		if num_w <= 0:
-			# pick smallest denomination
-			u_key_list = [(weight_dict[k], k) for k in weight_dict]
-			u_key_list.sort()  # sort by lowest to highest values
-			w_label = u_key_list[0][1]
-		#return ('[%s] => ' % src_price)+str(num_coins) + ' ' + str(coin_label)
+		num_w, w_label = _pick_unit(src_weight, weight_dict, sigfigs)
 		return format_number(num_w, sigfigs=sigfigs) + ' ' + str(w_label)
 
+def to_units(values: numpy.ndarray, unit_dict: {}=None, sigfigs:int=2, nofree=False) -> []:
+	# vectorized equivalent of to_currency()/to_weight() for a whole column of values,
+	# except that missing values are shown as '--' instead of raising when converting to units
+	values = numpy.asarray(values, dtype=float)
+	if unit_dict is None or len(unit_dict) == 0:
+		# no units specified, use raw values
+		fmt_str = _fmt(sigfigs)
+		return [fmt_str % v for v in values.tolist()]
+	missing = ~numpy.isfinite(values)
+	labels = list(unit_dict)
+	denoms = numpy.array([float(unit_dict[k]) for k in labels])
+	# rank labels alphabetically so that ties in unit count resolve the same way as sorting (count, label) tuples
+	label_rank = numpy.empty(len(labels), dtype=numpy.int64)
+	label_rank[numpy.argsort(numpy.array(labels, dtype=object), kind='stable')] = numpy.arange(len(labels))
+	with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+		ratios = values[:, None] / denoms[None, :]
+	# rows whose unit counts would not fit the int64 sort key (or that divide by zero) use the scalar path
+	in_range = numpy.isfinite(ratios) & (numpy.abs(ratios) < 2.0**62 / len(labels))
+	scalar_rows = ~missing & ~in_range.all(axis=1)
+	vector_rows = ~missing & ~scalar_rows
+	counts = numpy.where(vector_rows[:, None], ratios, 0).astype(numpy.int64)
+	# exact digit count: number of powers of ten <= |count|
+	digits = numpy.searchsorted(10 ** numpy.arange(19, dtype=numpy.int64), numpy.abs(counts), side='right')
+	sort_key = counts * len(labels) + label_rank[None, :]
+	qualified = digits >= sigfigs
+	# fewest units that still have enough sig-figs, otherwise the most units available
+	best_qualified = numpy.argmin(numpy.where(qualified, sort_key, numpy.iinfo(numpy.int64).max), axis=1)
+	best_any = numpy.argmax(sort_key, axis=1)
+	choice = numpy.where(qualified.any(axis=1), best_qualified, best_any)
+	rows = numpy.arange(len(values))
+	chosen_counts = counts[rows, choice]
+	chosen_labels = numpy.array(labels, dtype=object)[choice]
+	# pick smallest denomination when there is less than one of any unit
+	smallest_label = sorted((unit_dict[k], k) for k in unit_dict)[0][1]
+	empty = chosen_counts <= 0
+	chosen_labels[empty] = smallest_label
+	if nofree == True:
+		### no free lunch!
+		chosen_counts[empty] = 1
+	out = [format_number(n, sigfigs=sigfigs) + ' ' + str(label) for n, label in zip(chosen_counts.tolist(), chosen_labels.tolist())]
+	for r in numpy.flatnonzero(missing).tolist():
+		out[r] = '--'
+	for r in numpy.flatnonzero(scalar_rows).tolist():
+		# with nofree=False, to_currency() is the same calculation as to_weight()
+		out[r] = to_currency(values[r], currency_dict=unit_dict, sigfigs=sigfigs, nofree=nofree)
+	return out
+
+def _parse_kv(arg_str) -> tuple:
+	# splits a validated XX=#.# argument into (label, value)
+	s = str(arg_str).split('=')
+	return str(s[0]).strip(), float(str(s[1]).strip())
+
 def currency_validator(arg_str):
 	split = str(arg_str).split('=')
 	if len(split) != 2:
@@ -416,41 +467,35 @@ def currency_validator(arg_str):
 		raise argparse.ArgumentTypeError('Invalid currency argument: "%s". Value must be a decimal number' % arg_str)
 	return arg_str
 
+def _fmt(sigfigs: int, suffix: str='f') -> str:
+	# printf-style format strings are cached per (sigfigs, suffix) rather than rebuilt per call
+	key = (sigfigs, suffix)
+	fmt_str = _FMT_CACHE.get(key)
+	if fmt_str is None:
+		fmt_str = _FMT_CACHE[key] = '%.' + str(int(sigfigs)) + suffix
+	return fmt_str
+
 def format_number(x, sigfigs: int) -> str:
 	#digits = int_digits(x)
-	sf = '%i' % (sigfigs)
 	if x >= 1e15:
-		expr = '%.'+sf+'E'
-		return expr % x
+		return _fmt(sigfigs, 'E') % x
 	elif x >= 1e12:
-		expr = '%.' + sf + 'fT'
-		return expr % (x / 1e12)
+		return _fmt(sigfigs, 'fT') % (x / 1e12)
 	elif x >= 1e9:
-		expr = '%.' + sf + 'fB'
-		return expr % (x / 1e9)
+		return _fmt(sigfigs, 'fB') % (x / 1e9)
 	elif x >= 1e6:
-		expr = '%.' + sf + 'fM'
-		return expr % (x / 1e6)
+		return _fmt(sigfigs, 'fM') % (x / 1e6)
 	elif x >= 10000:
-		expr = '%.' + sf + 'fK'
-		return expr % (x / 1000)
+		return _fmt(sigfigs, 'fK') % (x / 1000)
 	elif x >= 1000:
 		return add_int_commas(int(x))
 	#
 	if int(x) == x:
 		return '%i' % x
 	else:
-		expr = '%.' + str(sigfigs) + 'f'
-		return expr % x
-def add_int_commas(x: int):
-	x = str(x)
-	xx = ''
-	for i in range(0, len(x)):
-		r = len(x) - i
-		if i > 0 and r % 3 == 0:
-			xx += ','
-		xx += x[i]
-	return xx
+		return _fmt(sigfigs) % x
+def add_int_commas(x: int) -> str:
+	return format(int(x), ',d')
 def int_digits(x) -> int:
 	if x is None:
 		return 0
@@ -467,44 +512,40 @@ def int_digits(x) -> int:
 	else:
 		return int(math.log10(abs(x)))
 
+def int_digits_int(n: int) -> int:
+	# integer-only fast path for int_digits()
+	if n == 0: return 0
+	return len(str(n)) if n > 0 else len(str(-n))
+
+def _lower_tag_set(tags: []) -> frozenset:
+	return frozenset(str(t).lower() for t in tags)
+
+def parse_tag_sets(df: DataFrame):
+	# same parsing as str(tags).strip().split(';'): only the whole entry is stripped, and a blank entry reads as 'nan'
+	return df['Tags'].fillna('nan').astype(str).str.strip().str.lower().str.split(';').map(frozenset)
+
+def _tag_sets(df: DataFrame):
+	if TAGSET_COLUMN in df.columns:
+		return df[TAGSET_COLUMN]
+	return parse_tag_sets(df)
+
 def includeTags(df: DataFrame, tags: []) -> DataFrame:
-	out_rows = []
-	for i, row in df.iterrows():
-		item_tags = [str(t).lower() for t in str(row['Tags']).strip().split(';')]
-		for t in [str(t).lower() for t in tags]:
-			if t in item_tags:
-				out_rows.append(row)
-				break
-	return DataFrame(out_rows, columns=df.columns)
+	lowered_tags = _lower_tag_set(tags)
+	mask = _tag_sets(df).map(lambda item_tags: not lowered_tags.isdisjoint(item_tags)).to_numpy(dtype=bool)
+	return df.loc[mask].reset_index(drop=True)
 
 def excludeTags(df: DataFrame, tags: []) -> DataFrame:
-	out_rows = []
-	for i, row in df.iterrows():
-		item_tags = [str(t).lower() for t in str(row['Tags']).strip().split(';')]
-		good = True
-		for t in [str(t).lower() for t in tags]:
-			if t in item_tags:
-				good = False
-				break
-		if good == True:
-			out_rows.append(row)
-	return DataFrame(out_rows, columns=df.columns)
+	lowered_tags = _lower_tag_set(tags)
+	mask = _tag_sets(df).map(lowered_tags.isdisjoint).to_numpy(dtype=bool)
+	return df.loc[mask].reset_index(drop=True)
 
 def requireTags(df: DataFrame, tags: []) -> DataFrame:
-	out_rows = []
-	for i, row in df.iterrows():
-		item_tags = [str(t).lower() for t in str(row['Tags']).strip().split(';')]
-		good = True
-		for t in [str(t).lower() for t in tags]:
-			if t not in item_tags:
-				good = False
-				break
-		if good == True:
-			out_rows.append(row)
-	return DataFrame(out_rows, columns=df.columns)
+	lowered_tags = _lower_tag_set(tags)
+	mask = _tag_sets(df).map(lowered_tags.issubset).to_numpy(dtype=bool)
+	return df.loc[mask].reset_index(drop=True)
 
 def format_entry(n):
-	if n is None:
+	if n is None or n is pandas.NA:
 		return '--'
 	elif type(n) == str:
 		return n